@@ -1,6 +1,6 @@
 import os
 import re
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterable, Iterator
 
 import requests
 from fastapi import FastAPI, HTTPException
@@ -17,6 +17,30 @@ from urllib.parse import urlencode
 import json
 from fastapi.responses import StreamingResponse
 
+import hashlib
+import threading
+import bisect
+from urllib.parse import urlparse
+from fastapi import Request
+from fastapi.responses import PlainTextResponse, Response
+
+import sys
+import logging
+import logging.handlers
+import contextlib
+import contextvars
+import functools
+from collections import Counter
+
+import sqlite3
+import random
+import asyncio
+import uuid
+import mmap
+from collections import deque, OrderedDict
+from fastapi import Header, Query
+from starlette.concurrency import run_in_threadpool
+
 
 
 # --- env & constants ---
@@ -26,6 +50,49 @@ SUNO_TOKEN = os.getenv("SUNO_TOKEN")
 GITHUB_TOKEN = os.getenv("GITHUB_TOKEN", "")
 PORT = int(os.getenv("PORT", "8787"))
 
+# upstream record/replay: "live" (default), "record" (live + save to cassettes), "replay" (offline).
+# replay needs none of our secrets (SUNO_TOKEN etc. aren't part of a cassette's key), but calls made
+# with a user's Spotify access token only replay for that same token
+UPSTREAM_MODE = os.getenv("JAM_UPSTREAM_MODE", "live").lower()
+CASSETTE_DIR = pathlib.Path(os.getenv("JAM_CASSETTE_DIR", "cassettes"))
+REPLAY_SPEED = float(os.getenv("JAM_REPLAY_SPEED", "1.0"))  # 2.0 = twice as fast, 0 = no delays
+
+# request tracing: anything slower than this gets dumped to the slow log (+ profile if JAM_PROFILE_HZ > 0)
+SLOW_REQUEST_MS = float(os.getenv("JAM_SLOW_REQUEST_MS", "10000"))
+SLOW_LOG_PATH = os.getenv("JAM_SLOW_LOG", "slow_requests.log")
+PROFILE_HZ = float(os.getenv("JAM_PROFILE_HZ", "0"))
+
+# production mode: JAM_ENV=production runs JAM_WORKERS processes (default: one per core) without the reloader;
+# caches and job state are shared between them through a sqlite (WAL) file. metrics stay per process:
+# every series gets a worker="<pid>" label and /metrics merges the snapshots the workers publish there
+JAM_ENV = os.getenv("JAM_ENV", "dev").lower()
+_workers_env = os.getenv("JAM_WORKERS", "auto" if JAM_ENV == "production" else "1")
+WORKERS = (os.cpu_count() or 1) if _workers_env == "auto" else max(1, int(_workers_env))
+STATE_DB = os.getenv("JAM_STATE_DB", "jam_state.db")
+TASTE_TTL_SEC = int(os.getenv("JAM_TASTE_TTL_SEC", "600"))
+STALE_TTL_SEC = 6 * 3600  # last-known-good fallbacks for open circuits (Spotify tokens rotate hourly anyway)
+FEATURES_TTL_SEC = 7 * 24 * 3600  # audio features of a track don't change
+HANDOFF_TTL_SEC = 5.0  # how long an in-flight result stays readable by the callers that waited on it
+CLIP_STATUS_TTL_SEC = 2.0  # pollers on any worker share one /clips call per window
+CLIP_CACHE_DIR = pathlib.Path(os.getenv("JAM_CLIP_CACHE_DIR", "clip_cache"))  # completed clips, kept forever
+CLIP_MEMORY_CACHE_SIZE = 5000
+README_MAX_BYTES = int(os.getenv("JAM_README_MAX_BYTES", str(64 * 1024)))  # we only need the title + first paragraph
+
+# admission control (per worker): concurrent generations, waiting room, and per-client share per route
+ANTHEM_CONCURRENCY = int(os.getenv("JAM_ANTHEM_CONCURRENCY", "8"))
+HACKJAM_ONCE_CONCURRENCY = int(os.getenv("JAM_HACKJAM_ONCE_CONCURRENCY", "4"))
+STREAM_SESSION_LIMIT = int(os.getenv("JAM_STREAM_SESSION_LIMIT", "8"))
+MAX_ONCE_COUNT = 5          # hackjam-once tracks per request when idle; shrinks with load
+MAX_STREAM_TRACKS = 10      # hackjam-stream tracks per session when idle; shrinks with load
+
+# circuit breakers per upstream host: trip on error/slow rates, fail fast while open, then probe
+BREAKER_WINDOW = 20                 # last N calls per host
+BREAKER_MIN_CALLS = 5
+BREAKER_ERROR_RATE = 0.5
+BREAKER_SLOW_SEC = float(os.getenv("JAM_BREAKER_SLOW_SEC", "8"))
+BREAKER_SLOW_RATE = 0.8
+BREAKER_COOLDOWN_SEC = float(os.getenv("JAM_BREAKER_COOLDOWN_SEC", "20"))
+
 if not SUNO_TOKEN:
     raise RuntimeError("Missing SUNO_TOKEN in environment")
 
@@ -57,10 +124,700 @@ class SongifyBody(BaseModel):
     mood: str = "lock-in"
     teamName: Optional[str] = None
 
+# --- metrics ---
+# tiny in-process prometheus registry: a lock + a dict per metric, cheap enough to leave on.
+# with several workers each one counts for itself, so series carry a worker label and a scrape
+# (which lands on any one worker) returns every worker's last published snapshot
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+_METRICS: List["_Metric"] = []
+
+class _Metric:
+    def __init__(self, name: str, help_text: str, kind: str, labels=(), buckets=None):
+        self.name, self.help, self.kind, self.labels = name, help_text, kind, tuple(labels)
+        self.buckets = tuple(buckets or ())
+        self._lock = threading.Lock()
+        self._values: Dict[tuple, Any] = {}
+        _METRICS.append(self)
+
+    def inc(self, *label_values, amount: float = 1.0):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def dec(self, *label_values, amount: float = 1.0):
+        self.inc(*label_values, amount=-amount)
+
+    def set(self, value: float, *label_values):
+        with self._lock:
+            self._values[label_values] = float(value)
+
+    def observe(self, value: float, *label_values):
+        with self._lock:
+            h = self._values.get(label_values)
+            if h is None:
+                h = self._values[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            i = bisect.bisect_left(self.buckets, value)
+            if i < len(self.buckets):
+                h[0][i] += 1
+            h[1] += value
+            h[2] += 1
+
+    def _fmt_labels(self, values, extra=None) -> str:
+        pairs = list(zip(self.labels, values)) + ([("worker", os.getpid())] if WORKERS > 1 else [])
+        pairs += [extra] if extra else []
+        if not pairs:
+            return ""
+        esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in pairs) + "}"
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def samples(self) -> List[str]:
+        out: List[str] = []
+        with self._lock:
+            items = sorted(self._values.items())
+            items = [(k, [list(v[0]), v[1], v[2]] if self.kind == "histogram" else v) for k, v in items]
+        for labels, v in items:
+            if self.kind != "histogram":
+                out.append(f"{self.name}{self._fmt_labels(labels)} {v:g}")
+                continue
+            counts, total, n = v
+            running = 0
+            for b, c in zip(self.buckets, counts):
+                running += c
+                out.append(f"{self.name}_bucket{self._fmt_labels(labels, ('le', f'{b:g}'))} {running}")
+            out.append(f"{self.name}_bucket{self._fmt_labels(labels, ('le', '+Inf'))} {n}")
+            out.append(f"{self.name}_sum{self._fmt_labels(labels)} {total:g}")
+            out.append(f"{self.name}_count{self._fmt_labels(labels)} {n}")
+        return out
+
+HTTP_REQUESTS = _Metric("jam_http_requests_total", "HTTP requests by route and status", "counter", ("method", "route", "status"))
+HTTP_LATENCY = _Metric("jam_http_request_seconds", "HTTP request latency (time to response start)", "histogram", ("method", "route"), _LATENCY_BUCKETS)
+UPSTREAM_REQUESTS = _Metric("jam_upstream_requests_total", "Outbound calls by upstream host and status", "counter", ("host", "method", "status"))
+UPSTREAM_LATENCY = _Metric("jam_upstream_request_seconds", "Outbound call latency by upstream host", "histogram", ("host",), _LATENCY_BUCKETS)
+CLIP_POLL_ITERATIONS = _Metric("jam_clip_poll_iterations", "Suno /clips polls per wait", "histogram", ("target", "outcome"), (1, 2, 3, 5, 8, 13, 21, 34, 55, 89))
+DOWNLOAD_BYTES = _Metric("jam_download_bytes_total", "MP3 bytes downloaded", "counter")
+DOWNLOAD_LATENCY = _Metric("jam_download_seconds", "MP3 download duration", "histogram", (), _LATENCY_BUCKETS)
+ADMISSION_SHED = _Metric("jam_admission_shed_total", "Requests rejected with 503 by admission control", "counter", ("gate", "reason"))
+ADMISSION_WAIT = _Metric("jam_admission_wait_seconds", "Time spent queued before admission", "histogram", ("gate",), _LATENCY_BUCKETS)
+CIRCUIT_STATE = _Metric("jam_circuit_state", "Upstream circuit breaker state (0 closed, 1 half-open, 2 open)", "gauge", ("host",))
+CIRCUIT_REJECTED = _Metric("jam_circuit_rejected_total", "Upstream calls failed fast by an open circuit", "counter", ("host",))
+SSE_INFLIGHT = _Metric("jam_sse_sessions_inflight", "Open hackjam-stream SSE sessions", "gauge")
+STREAM_SESSIONS_LIVE = _Metric("jam_stream_sessions_live", "hackjam-stream sessions still generating", "gauge")
+
+METRICS_PUBLISH_SEC = 5.0
+
+def publish_metrics() -> Dict[str, List[str]]:
+    """Put this worker's samples in STORE for whichever worker gets scraped next."""
+    snapshot = {m.name: m.samples() for m in _METRICS}
+    STORE.set("metrics", str(os.getpid()), snapshot, ttl=METRICS_PUBLISH_SEC * 3)
+    return snapshot
+
+def _metrics_publisher() -> None:
+    while True:
+        time.sleep(METRICS_PUBLISH_SEC)
+        try:
+            publish_metrics()
+        except Exception:
+            pass  # a missed snapshot only makes the next scrape a little staler
+
+def render_metrics() -> str:
+    if WORKERS > 1:
+        publish_metrics()
+        snapshots = list(STORE.get_ns("metrics").values())  # exited workers age out with the ttl
+    else:
+        snapshots = [{m.name: m.samples() for m in _METRICS}]
+    lines: List[str] = []
+    for m in _METRICS:
+        lines.extend(m.header())
+        for snap in snapshots:
+            lines.extend(snap.get(m.name, []))
+    return "\n".join(lines) + "\n"
+
+# --- request tracing ---
+# spans are collected on a Trace held in a contextvar; FastAPI copies the context into the
+# threadpool, so sync handlers and everything they call (jfetch etc.) land on the request's trace
+class Trace:
+    def __init__(self, name: str):
+        self.name = name
+        self.started_at = time.time()
+        self.t0 = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+        self.samples: Counter = Counter()  # collapsed stacks from the sampling profiler
+        self._lock = threading.Lock()
+
+    def add(self, name: str, start: float, end: float):
+        with self._lock:
+            self.spans.append({"name": name, "start_ms": round((start - self.t0) * 1000, 1), "dur_ms": round((end - start) * 1000, 1)})
+
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self.t0) * 1000
+
+    def stages(self) -> Dict[str, float]:
+        """span durations summed by name, e.g. {"taste": 812.4, "upstream.api.spotify.com": 790.1}"""
+        out: Dict[str, float] = {}
+        with self._lock:
+            for sp in self.spans:
+                out[sp["name"]] = round(out.get(sp["name"], 0.0) + sp["dur_ms"], 1)
+        return out
+
+    def server_timing(self) -> str:
+        parts = [f'{re.sub(r"[^A-Za-z0-9._-]", "_", name)};dur={dur}' for name, dur in self.stages().items()]
+        parts.append(f"total;dur={self.total_ms():.1f}")
+        return ", ".join(parts)
+
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("jam_trace", default=None)
+_sampled_threads: Dict[int, List[Any]] = {}  # thread id -> [trace, depth]
+_sampled_lock = threading.Lock()
+
+@contextlib.contextmanager
+def use_trace(trace: Trace):
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+@contextlib.contextmanager
+def span(name: str):
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    tid = threading.get_ident()
+    if PROFILE_HZ > 0:
+        with _sampled_lock:
+            entry = _sampled_threads.setdefault(tid, [trace, 0])
+            entry[1] += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, start, time.perf_counter())
+        if PROFILE_HZ > 0:
+            with _sampled_lock:
+                entry = _sampled_threads.get(tid)
+                if entry:
+                    entry[1] -= 1
+                    if entry[1] <= 0:
+                        del _sampled_threads[tid]
+
+def traced(name: str):
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+def _profiler_loop():
+    # poor man's sampling profiler: only threads currently inside a span are sampled
+    interval = 1.0 / PROFILE_HZ
+    while True:
+        time.sleep(interval)
+        with _sampled_lock:
+            targets = {tid: entry[0] for tid, entry in _sampled_threads.items()}
+        if not targets:
+            continue
+        frames = sys._current_frames()
+        for tid, trace in targets.items():
+            frame = frames.get(tid)
+            stack = []
+            while frame is not None and len(stack) < 40:
+                stack.append(f"{frame.f_code.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            if stack:
+                trace.samples[";".join(reversed(stack))] += 1
+
+if PROFILE_HZ > 0:
+    threading.Thread(target=_profiler_loop, name="jam-profiler", daemon=True).start()
+
+_slow_log: Optional[logging.Logger] = None
+
+def finish_trace(trace: Trace, **extra) -> None:
+    """Dump the trace to the rotating slow-request log if it blew past JAM_SLOW_REQUEST_MS."""
+    global _slow_log
+    total = trace.total_ms()
+    if total < SLOW_REQUEST_MS:
+        return
+    if _slow_log is None:
+        _slow_log = logging.getLogger("jam.slow")
+        _slow_log.propagate = False
+        _slow_log.setLevel(logging.INFO)
+        _slow_log.addHandler(logging.handlers.RotatingFileHandler(SLOW_LOG_PATH, maxBytes=5_000_000, backupCount=3))
+    record = {
+        "ts": trace.started_at,
+        "name": trace.name,
+        "total_ms": round(total, 1),
+        "stages": trace.stages(),
+        "spans": trace.spans,
+        **extra,
+    }
+    if trace.samples:
+        record["profile"] = [{"stack": st, "samples": n} for st, n in trace.samples.most_common(20)]
+    _slow_log.info(json.dumps(record, default=str))
+
+# --- shared state ---
+# tiny kv store on sqlite in WAL mode so every worker process sees the same caches and jobs.
+# values are JSON; rows past expires_at are treated as missing and swept now and then
+class SharedStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS kv (ns TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+            "expires_at REAL, PRIMARY KEY (ns, key))"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, ns: str, key: str) -> Any:
+        row = self._conn().execute(
+            "SELECT value FROM kv WHERE ns = ? AND key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (ns, key, time.time()),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_many(self, ns: str, keys: List[str]) -> Dict[str, Any]:
+        out: Dict[str, Any] = {}
+        now = time.time()
+        for i in range(0, len(keys), 500):  # stay under sqlite's bound-parameter limit
+            chunk = keys[i:i+500]
+            rows = self._conn().execute(
+                f"SELECT key, value FROM kv WHERE ns = ? AND key IN ({','.join('?' * len(chunk))}) "
+                "AND (expires_at IS NULL OR expires_at > ?)",
+                (ns, *chunk, now),
+            ).fetchall()
+            out.update({k: json.loads(v) for k, v in rows})
+        return out
+
+    def get_ns(self, ns: str) -> Dict[str, Any]:
+        rows = self._conn().execute(
+            "SELECT key, value FROM kv WHERE ns = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (ns, time.time()),
+        ).fetchall()
+        return {k: json.loads(v) for k, v in rows}
+
+    def set(self, ns: str, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self.set_many(ns, {key: value}, ttl)
+
+    def set_many(self, ns: str, items: Dict[str, Any], ttl: Optional[float] = None) -> None:
+        expires = time.time() + ttl if ttl else None
+        conn = self._conn()
+        conn.executemany(
+            "INSERT OR REPLACE INTO kv (ns, key, value, expires_at) VALUES (?, ?, ?, ?)",
+            [(ns, k, json.dumps(v), expires) for k, v in items.items()],
+        )
+        if random.random() < 0.01:
+            conn.execute("DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at < ?", (time.time(),))
+
+    def delete(self, ns: str, key: str) -> None:
+        self._conn().execute("DELETE FROM kv WHERE ns = ? AND key = ?", (ns, key))
+
+    def claim(self, ns: str, key: str, ttl: float, owner: Any = None) -> bool:
+        """Atomically take ns/key if nobody holds it (or their claim expired). True if we got it.
+        The stored value is owner (default: our pid)."""
+        now = time.time()
+        cur = self._conn().execute(
+            "INSERT INTO kv (ns, key, value, expires_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (ns, key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at "
+            "WHERE kv.expires_at IS NOT NULL AND kv.expires_at <= ?",
+            (ns, key, json.dumps(os.getpid() if owner is None else owner), now + ttl, now),
+        )
+        return cur.rowcount == 1
+
+STORE = SharedStore(STATE_DB)
+
+def shared_once(ns: str, key: str, fn, ttl: Optional[float], wait_sec: float = 60):
+    """Return the cached ns/key, or compute it with fn() in exactly one worker while the others wait for it."""
+    hit = STORE.get(ns, key)
+    if hit is not None:
+        return hit
+    lock_ns = f"{ns}:inflight"
+    if STORE.claim(lock_ns, key, ttl=wait_sec):
+        try:
+            value = fn()
+            STORE.set(ns, key, value, ttl=ttl)
+            return value
+        finally:
+            STORE.delete(lock_ns, key)
+    deadline = time.time() + wait_sec
+    while time.time() < deadline:
+        time.sleep(0.2)
+        hit = STORE.get(ns, key)
+        if hit is not None:
+            return hit
+        if STORE.get(lock_ns, key) is None:
+            break  # owner gave up (error) without publishing a value
+    return fn()
+
+def coalesce_inflight(ns: str, key: str, fn, wait_sec: float = 60):
+    """Share one fn() call among callers that arrive while it is in flight (any worker).
+    Unlike shared_once nothing is cached: once the call finishes, the next caller runs fn() again."""
+    lock_ns = f"{ns}:inflight"
+    deadline = time.time() + wait_sec
+    while time.time() < deadline:
+        call_id = uuid.uuid4().hex
+        if STORE.claim(lock_ns, key, ttl=wait_sec, owner=call_id):
+            try:
+                value = fn()
+                # keyed by call id, so only callers that saw this call in flight can pick it up
+                STORE.set(ns, f"{key}:{call_id}", value, ttl=HANDOFF_TTL_SEC)
+                return value
+            finally:
+                STORE.delete(lock_ns, key)
+        owner = STORE.get(lock_ns, key)
+        while owner is not None and time.time() < deadline:
+            time.sleep(0.2)
+            still_running = STORE.get(lock_ns, key) == owner
+            hit = STORE.get(ns, f"{key}:{owner}")
+            if hit is not None:
+                return hit
+            if not still_running:
+                break  # owner failed without publishing; try to take the call ourselves
+    return fn()
+
+def _token_key(token: str) -> str:
+    # never persist raw Spotify tokens
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+# --- admission control ---
+# under a spike we'd rather turn people away fast (503 + Retry-After) than let every request
+# slow down together until they all time out. each gate bounds active work and the waiting room,
+# caps how much of it one client can hold, and hands free slots to the least-served client first.
+# waiting happens on the event loop (routes await acquire() before handing off to the threadpool),
+# so a full waiting room never ties up worker threads and shedding stays fast even when they're busy.
+# release() is thread-safe: slots are handed back from the threadpool and from session threads.
+class AdmissionGate:
+    def __init__(self, name: str, max_active: int, max_queue: int, per_client: int, queue_timeout: float):
+        self.name = name
+        self.max_active, self.max_queue = max(1, max_active), max(0, max_queue)
+        self.per_client, self.queue_timeout = max(1, per_client), queue_timeout
+        self.active = 0
+        self.by_client: Counter = Counter()  # active per client
+        self.held: Counter = Counter()       # active + queued per client
+        self.waiting: List[tuple] = []       # (ticket, client, future)
+        self._tickets = 0
+        self._avg_service = 5.0              # EWMA seconds, feeds Retry-After
+        self._lock = threading.Lock()        # never held across an await
+
+    def load(self) -> float:
+        """0.0 idle .. 1.0 saturated (all slots busy and the waiting room full)"""
+        with self._lock:
+            return min(1.0, (self.active + len(self.waiting)) / (self.max_active + self.max_queue))
+
+    def scaled_limit(self, cap: int) -> int:
+        """Shrink a per-request work cap (count, maxTracks) as the gate fills up."""
+        return max(1, int(round(cap * (1.0 - self.load()))))
+
+    def _retry_after(self) -> int:
+        backlog = len(self.waiting) + 1
+        return max(1, min(120, int(self._avg_service * backlog / self.max_active) + 1))
+
+    def _shed(self, reason: str):
+        ADMISSION_SHED.inc(self.name, reason)
+        raise HTTPException(
+            status_code=503,
+            detail=f"{self.name} is busy ({reason}), try again shortly",
+            headers={"Retry-After": str(self._retry_after())},
+        )
+
+    def _grant_next(self) -> None:
+        # fairness: the waiter whose client holds the fewest active slots goes first, FIFO among equals.
+        # the slot is taken here (under the lock) and the waiter's future is woken on its own loop
+        while self.waiting and self.active < self.max_active:
+            entry = min(self.waiting, key=lambda w: (self.by_client[w[1]], w[0]))
+            self.waiting.remove(entry)
+            self.active += 1
+            self.by_client[entry[1]] += 1
+            fut = entry[2]
+            fut.get_loop().call_soon_threadsafe(lambda f=fut: f.done() or f.set_result(None))
+
+    async def acquire(self, client: str) -> None:
+        t0 = time.perf_counter()
+        with self._lock:
+            if self.held[client] >= self.per_client:
+                self._shed("per_client")
+            if self.active >= self.max_active and not self.waiting and self.max_queue == 0:
+                self._shed("saturated")
+            if self.active >= self.max_active and len(self.waiting) >= self.max_queue:
+                self._shed("queue_full")
+            self.held[client] += 1
+            if self.active < self.max_active and not self.waiting:
+                self.active += 1
+                self.by_client[client] += 1
+                ADMISSION_WAIT.observe(0.0, self.name)
+                return
+            self._tickets += 1
+            entry = (self._tickets, client, asyncio.get_running_loop().create_future())
+            self.waiting.append(entry)
+        try:
+            await asyncio.wait_for(asyncio.shield(entry[2]), self.queue_timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                if entry in self.waiting:
+                    self.waiting.remove(entry)
+                    self._drop(client)
+                    self._shed("queue_timeout")
+            # otherwise the slot came through just as we gave up on it: keep it
+        except asyncio.CancelledError:
+            with self._lock:
+                queued = entry in self.waiting
+                if queued:
+                    self.waiting.remove(entry)
+                    self._drop(client)
+            if not queued:
+                self.release(client)  # client went away after the slot was granted
+            raise
+        ADMISSION_WAIT.observe(time.perf_counter() - t0, self.name)
+
+    def _drop(self, client: str) -> None:
+        self.held[client] -= 1
+        for c in (self.by_client, self.held):
+            if client in c and c[client] <= 0:
+                del c[client]
+
+    def release(self, client: str, service_sec: Optional[float] = None) -> None:
+        with self._lock:
+            self.active -= 1
+            self.by_client[client] -= 1
+            self._drop(client)
+            if service_sec is not None:
+                self._avg_service = 0.8 * self._avg_service + 0.2 * service_sec
+            self._grant_next()
+
+    @contextlib.asynccontextmanager
+    async def admit(self, client: str):
+        await self.acquire(client)
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(client, time.perf_counter() - t0)
+
+ANTHEM_GATE = AdmissionGate("team-anthem", ANTHEM_CONCURRENCY, max_queue=2 * ANTHEM_CONCURRENCY, per_client=2, queue_timeout=10)
+HACKJAM_ONCE_GATE = AdmissionGate("hackjam-once", HACKJAM_ONCE_CONCURRENCY, max_queue=HACKJAM_ONCE_CONCURRENCY, per_client=1, queue_timeout=10)
+# stream sessions run for minutes, so there's no point queueing for one
+STREAM_GATE = AdmissionGate("hackjam-stream", STREAM_SESSION_LIMIT, max_queue=0, per_client=1, queue_timeout=0)
+
+def client_key(request: Request, users: Optional[List[Any]] = None) -> str:
+    """Spotify user (hashed token) when we have one, else the caller's IP."""
+    if users:
+        return "spotify:" + _token_key(users[0].accessToken)[:16]
+    fwd = request.headers.get("x-forwarded-for")
+    host = fwd.split(",")[0].strip() if fwd else (request.client.host if request.client else "unknown")
+    return "ip:" + host
+
+# --- circuit breakers ---
+# one per upstream host. closed: calls go through and outcomes are tallied over a sliding window;
+# too many errors (exceptions, 5xx, 429) or slow calls opens it. open: calls fail immediately with
+# CircuitOpen instead of eating the full timeout. after the cooldown one probe call is let through
+# (half-open) and its outcome decides whether we close again or go back to open.
+class CircuitOpen(HTTPException):
+    """Raised instead of calling an upstream whose circuit is open. Callers can fall back to stale data."""
+
+class CircuitBreaker:
+    def __init__(self, host: str):
+        self.host = host
+        self.state = "closed"
+        self.outcomes: deque = deque(maxlen=BREAKER_WINDOW)  # (failed, slow)
+        self.opened_at = 0.0
+        self.probing = False
+        self._lock = threading.Lock()
+
+    def before_call(self) -> None:
+        with self._lock:
+            if self.state == "closed":
+                return
+            wait = self.opened_at + BREAKER_COOLDOWN_SEC - time.time()
+            if self.state == "open" and wait <= 0:
+                self._set_state("half_open")
+            if self.state == "half_open" and not self.probing:
+                self.probing = True  # we're the probe
+                return
+        CIRCUIT_REJECTED.inc(self.host)
+        raise CircuitOpen(
+            status_code=503,
+            detail=f"{self.host} is unavailable (circuit open)",
+            headers={"Retry-After": str(max(1, int(wait) + 1))},
+        )
+
+    def record(self, failed: bool, elapsed: float) -> None:
+        slow = elapsed >= BREAKER_SLOW_SEC
+        with self._lock:
+            if self.state == "half_open":
+                self.probing = False
+                if failed or slow:
+                    self._open()
+                else:
+                    self.outcomes.clear()
+                    self._set_state("closed")
+                return
+            if self.state == "open":
+                return  # a straggler that started before we tripped
+            self.outcomes.append((failed, slow))
+            n = len(self.outcomes)
+            if n >= BREAKER_MIN_CALLS:
+                errors = sum(1 for f, _ in self.outcomes if f)
+                slows = sum(1 for _, sl in self.outcomes if sl)
+                if errors / n >= BREAKER_ERROR_RATE or slows / n >= BREAKER_SLOW_RATE:
+                    self._open()
+
+    def _open(self) -> None:
+        self.opened_at = time.time()
+        self._set_state("open")
+
+    def _set_state(self, state: str) -> None:
+        self.state = state
+        CIRCUIT_STATE.set({"closed": 0, "half_open": 1, "open": 2}[state], self.host)
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+def breaker_for(host: str) -> CircuitBreaker:
+    with _breakers_lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker(host)
+        return _breakers[host]
+
+# --- upstream record/replay ---
+# every outbound call goes through upstream_request so event-day traffic can be
+# recorded once and re-run offline (timings included) for profiling
+_cassette_lock = threading.Lock()
+_cassette_index: Dict[str, List[Dict[str, Any]]] = {}  # key -> entries, read from disk once
+_replay_cursor: Dict[str, int] = {}
+
+def _load_index(key: str) -> List[Dict[str, Any]]:
+    """Entries recorded for key (callers hold _cassette_lock)."""
+    entries = _cassette_index.get(key)
+    if entries is None:
+        entries = []
+        index_path = CASSETTE_DIR / f"{key}.jsonl"
+        if index_path.exists():
+            with open(index_path) as f:
+                entries = [json.loads(line) for line in f if line.strip()]
+        _cassette_index[key] = entries
+    return entries
+
+def _server_credential(auth: str) -> bool:
+    # our own secrets (Suno, GitHub, Spotify client Basic auth) say nothing about the request
+    return auth.startswith("Basic ") or auth in {f"Bearer {t}" for t in (SUNO_TOKEN, GITHUB_TOKEN) if t}
+
+def _cassette_key(method: str, url: str, kwargs: Dict[str, Any]) -> str:
+    # per-user auth (Spotify access tokens) is hashed in so different users don't collide, but never
+    # stored in the clear. server-side credentials are left out, so replay doesn't need the recording
+    # machine's secrets; replaying a user's calls does need the same access token they recorded with
+    auth = (kwargs.get("headers") or {}).get("Authorization", "")
+    if _server_credential(auth):
+        auth = ""
+    parts = [
+        method.upper(),
+        url,
+        json.dumps(kwargs.get("params") or {}, sort_keys=True, default=str),
+        json.dumps(kwargs.get("json"), sort_keys=True, default=str),
+        json.dumps(kwargs.get("data"), sort_keys=True, default=str),
+        (kwargs.get("headers") or {}).get("Range", ""),
+        auth,
+    ]
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()[:32]
+
+# content-length goes too: a capped recording is shorter than what the server announced
+_UNRECORDED_HEADERS = ("set-cookie", "content-encoding", "transfer-encoding", "content-length")
+
+def _record_interaction(key: str, method: str, url: str, resp: requests.Response, elapsed: float,
+                        max_bytes: Optional[int] = None) -> None:
+    CASSETTE_DIR.mkdir(parents=True, exist_ok=True)
+    if max_bytes is None:
+        body = resp.content  # also caches the body on resp for the caller
+    else:
+        # streamed call with a byte ceiling: don't let a server that ignores Range make us read it all
+        body = b""
+        for chunk in resp.iter_content(chunk_size=8192):
+            body += chunk[:max_bytes - len(body)]
+            if len(body) >= max_bytes:
+                break
+        resp.close()
+        resp._content, resp._content_consumed = body, True  # the caller iterates the recorded prefix
+    with _cassette_lock:
+        entries = _load_index(key)
+        body_name = f"{key}-{len(entries)}.body"
+        (CASSETTE_DIR / body_name).write_bytes(body)
+        entry = {
+            "method": method.upper(),
+            "url": url,
+            "final_url": resp.url,
+            "status": resp.status_code,
+            "headers": {k: v for k, v in resp.headers.items() if k.lower() not in _UNRECORDED_HEADERS},
+            "elapsed": round(elapsed, 4),
+            "body": body_name,
+            "recorded_at": time.time(),
+        }
+        with open(CASSETTE_DIR / f"{key}.jsonl", "a") as f:
+            f.write(json.dumps(entry) + "\n")
+        entries.append(entry)
+
+def _replay_interaction(key: str, method: str, url: str) -> requests.Response:
+    with _cassette_lock:
+        entries = _load_index(key)
+        if not entries:
+            raise HTTPException(status_code=504, detail=f"replay: no recorded response for {method.upper()} {url}")
+        # repeated calls (e.g. /clips polling) walk the recorded sequence, then stick on the last one
+        i = _replay_cursor.get(key, 0)
+        _replay_cursor[key] = i + 1
+        entry = entries[min(i, len(entries) - 1)]
+    if REPLAY_SPEED > 0:
+        time.sleep(entry.get("elapsed", 0.0) / REPLAY_SPEED)
+
+    resp = requests.Response()
+    resp.status_code = entry["status"]
+    resp.headers.update(entry.get("headers") or {})
+    resp.url = entry.get("final_url") or url
+    resp._content = (CASSETTE_DIR / entry["body"]).read_bytes()
+    resp._content_consumed = True
+    resp.encoding = requests.utils.get_encoding_from_headers(resp.headers)
+    return resp
+
+def upstream_request(method: str, url: str, max_bytes: Optional[int] = None, **kwargs) -> requests.Response:
+    """requests.request, but honours JAM_UPSTREAM_MODE (live / record / replay) and the host's circuit breaker.
+    max_bytes caps how much of a stream=True body gets recorded (the caller caps what it reads)."""
+    host = urlparse(url).hostname or "unknown"
+    breaker = breaker_for(host)
+    breaker.before_call()  # raises CircuitOpen without touching the network
+    t0 = time.perf_counter()
+    status = "error"
+    try:
+        with span(f"upstream.{host}"):
+            if UPSTREAM_MODE == "replay":
+                status = "replay_miss"  # until the cassette produces a response
+                resp = _replay_interaction(_cassette_key(method, url, kwargs), method, url)
+            else:
+                resp = requests.request(method, url, **kwargs)
+                if UPSTREAM_MODE == "record":
+                    _record_interaction(_cassette_key(method, url, kwargs), method, url, resp, time.perf_counter() - t0,
+                                        max_bytes if kwargs.get("stream") else None)
+        status = str(resp.status_code)
+        return resp
+    finally:
+        elapsed = time.perf_counter() - t0
+        # 4xx (bad token, missing README) is the caller's problem, not the upstream being down; neither is
+        # a call missing from the cassette (recorded failures still count, so replayed outages trip it)
+        if status != "replay_miss":
+            breaker.record(failed=status == "error" or status == "429" or status.startswith("5"), elapsed=elapsed)
+        UPSTREAM_REQUESTS.inc(host, method.upper(), status)
+        UPSTREAM_LATENCY.observe(elapsed, host)
+
 # --- helpers ---
 def jfetch(method: str, url: str, **kwargs) -> Any:
     """requests wrapper that raises nice errors and returns JSON"""
-    resp = requests.request(method, url, timeout=30, **kwargs)
+    resp = upstream_request(method, url, timeout=30, **kwargs)
     try:
         data = resp.json() if resp.text else {}
     except Exception:
@@ -70,7 +827,139 @@ def jfetch(method: str, url: str, **kwargs) -> Any:
         raise HTTPException(status_code=resp.status_code, detail=f"{url} -> {msg}")
     return data
 
+@traced("generate")
+def suno_generate(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """POST /generate and return the new clip object. Identical in-flight payloads (any worker) share one clip."""
+    key = hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+    return coalesce_inflight("gen", key, lambda: jfetch(
+        "POST",
+        f"{SUNO_BASE}/generate",
+        headers={"Authorization": f"Bearer {SUNO_TOKEN}", "Content-Type": "application/json"},
+        json=payload,
+    ))
+
+# a "complete" clip never changes again, so it's cached for good: in memory, and on disk (shared by workers)
+_complete_clips: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_complete_clips_lock = threading.Lock()
+
+def _is_complete(clip: Any) -> bool:
+    return isinstance(clip, dict) and (clip.get("status") or "").lower() == "complete"
+
+def cached_complete_clip(clip_id: str) -> Optional[Dict[str, Any]]:
+    with _complete_clips_lock:
+        clip = _complete_clips.get(clip_id)
+        if clip is not None:
+            _complete_clips.move_to_end(clip_id)
+            return clip
+    if not re.fullmatch(r"[A-Za-z0-9_-]+", clip_id):
+        return None  # never build paths from junk ids
+    path = CLIP_CACHE_DIR / f"{clip_id}.json"
+    if not path.exists():
+        return None
+    clip = json.loads(path.read_text())
+    _remember_complete_clip(clip_id, clip, write_disk=False)
+    return clip
+
+def _remember_complete_clip(clip_id: str, clip: Dict[str, Any], write_disk: bool = True) -> None:
+    with _complete_clips_lock:
+        _complete_clips[clip_id] = clip
+        _complete_clips.move_to_end(clip_id)
+        while len(_complete_clips) > CLIP_MEMORY_CACHE_SIZE:
+            _complete_clips.popitem(last=False)
+    if write_disk and re.fullmatch(r"[A-Za-z0-9_-]+", clip_id):
+        CLIP_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = CLIP_CACHE_DIR / f"{clip_id}.json.{os.getpid()}.part"
+        tmp.write_text(json.dumps(clip))
+        os.replace(tmp, CLIP_CACHE_DIR / f"{clip_id}.json")
+
+def fetch_clips(clip_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Resolve many clips: completed ones from cache, fresh in-progress ones from the shared store,
+    and everything else in a single multi-id Suno /clips call."""
+    found: Dict[str, Dict[str, Any]] = {}
+    for cid in clip_ids:
+        clip = cached_complete_clip(cid)
+        if clip is not None:
+            found[cid] = clip
+    pending = [cid for cid in dict.fromkeys(clip_ids) if cid not in found]
+    if pending:
+        found.update(STORE.get_many("clip", pending))
+        pending = [cid for cid in pending if cid not in found]
+    for i in range(0, len(pending), 100):
+        chunk = pending[i:i+100]
+        data = jfetch(
+            "GET",
+            f"{SUNO_BASE}/clips",
+            headers={"Authorization": f"Bearer {SUNO_TOKEN}"},
+            params={"ids": ",".join(chunk)},
+        )
+        in_progress = {}
+        for clip in data if isinstance(data, list) else []:
+            cid = clip.get("id") if isinstance(clip, dict) else None
+            if cid not in chunk:
+                continue
+            found[cid] = clip
+            if _is_complete(clip):
+                _remember_complete_clip(cid, clip)
+            else:
+                in_progress[cid] = clip
+        if in_progress:
+            STORE.set_many("clip", in_progress, ttl=CLIP_STATUS_TTL_SEC)
+    return found
+
+def fetch_clip(clip_id: str) -> Dict[str, Any]:
+    """One clip via fetch_clips; {} if Suno doesn't know it."""
+    return fetch_clips([clip_id]).get(clip_id, {})
+
+def clip_response(request: Request, content: Any, immutable: bool) -> Response:
+    """JSON with an ETag; completed clips get long-lived caching and 304s on If-None-Match."""
+    body = json.dumps(content, sort_keys=True, separators=(",", ":"))
+    etag = '"' + hashlib.sha256(body.encode("utf-8")).hexdigest()[:32] + '"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "public, max-age=31536000, immutable" if immutable else "no-cache",
+    }
+    if etag in [t.strip() for t in (request.headers.get("if-none-match") or "").split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def fetch_audio_features(headers: Dict[str, str], ids: List[str]) -> List[Dict[str, Any]]:
+    """Audio features for track ids, chunked 100 per call; per-track results are cached in the shared store."""
+    found = STORE.get_many("features", ids)
+    missing = [i for i in dict.fromkeys(ids) if i not in found]
+    for i in range(0, len(missing), 100):
+        chunk = missing[i:i+100]
+        try:
+            af = jfetch("GET", "https://api.spotify.com/v1/audio-features",
+                        headers=headers, params={"ids": ",".join(chunk)})
+        except CircuitOpen:
+            raise  # don't cache a half-empty profile; let the caller fall back to stale taste
+        except HTTPException:
+            continue
+        fresh = {f["id"]: f for f in af.get("audio_features") or [] if f and f.get("id")}
+        if fresh:
+            STORE.set_many("features", fresh, ttl=FEATURES_TTL_SEC)
+            found.update(fresh)
+    return [found[i] for i in ids if i in found]
+
+@traced("taste")
 def fetch_spotify_taste(access_token: str) -> Dict[str, Any]:
+    # profiling a user is ~5 sequential Spotify calls, so share it across requests and workers
+    key = _token_key(access_token)
+
+    def _fresh() -> Dict[str, Any]:
+        taste = _fetch_spotify_taste(access_token)
+        STORE.set("taste_stale", key, taste, ttl=STALE_TTL_SEC)  # last known good
+        return taste
+
+    try:
+        return shared_once("taste", key, _fresh, ttl=TASTE_TTL_SEC)
+    except CircuitOpen:
+        stale = STORE.get("taste_stale", key)
+        if stale is None:
+            raise
+        return {**stale, "stale": True}
+
+def _fetch_spotify_taste(access_token: str) -> Dict[str, Any]:
     headers = {"Authorization": f"Bearer {access_token}"}
 
     # top artists --> genres
@@ -88,21 +977,12 @@ def fetch_spotify_taste(access_token: str) -> Dict[str, Any]:
 
     features = {"tempo": 0.0, "energy": 0.0, "danceability": 0.0, "valence": 0.0, "count": 0}
     if ids:
-        for i in range(0, len(ids), 100):
-            chunk = ids[i:i+100]
-            try:
-                af = jfetch("GET", "https://api.spotify.com/v1/audio-features",
-                            headers=headers, params={"ids": ",".join(chunk)})
-            except HTTPException:
-                continue
-            for f in af.get("audio_features") or []:
-                if not f:
-                    continue
-                features["tempo"] += f.get("tempo") or 0.0
-                features["energy"] += f.get("energy") or 0.0
-                features["danceability"] += f.get("danceability") or 0.0
-                features["valence"] += f.get("valence") or 0.0
-                features["count"] += 1
+        for f in fetch_audio_features(headers, ids):
+            features["tempo"] += f.get("tempo") or 0.0
+            features["energy"] += f.get("energy") or 0.0
+            features["danceability"] += f.get("danceability") or 0.0
+            features["valence"] += f.get("valence") or 0.0
+            features["count"] += 1
 
     # Fallback: if new accounts have no top data, use recently played
     if not genres and features["count"] == 0:
@@ -137,6 +1017,7 @@ MOOD_MAP: Dict[str, Dict[str, Any]] = {
     "monster-energy": {"tags": ["dnb", "hard techno", "aggressive"],           "delta": {"tempo": +30, "energy": +0.35,"danceability": +0.1},  "instrumental": False},
 }
 
+@traced("fuse")
 def fuse_tags(per_user: List[Dict[str, Any]], mood: str, force_instrumental: Optional[bool]) -> Dict[str, Any]:
     #genre tallies
     freq: Dict[str, int] = {}
@@ -188,28 +1069,80 @@ def fuse_tags(per_user: List[Dict[str, Any]], mood: str, force_instrumental: Opt
 def parse_readme(md: str) -> Dict[str, str]:
     if not md:
         return {"title": "", "tldr": ""}
-    m = re.search(r"^#\s+(.+)$", md, flags=re.MULTILINE)
-    title = (m.group(1).strip() if m else "")
-    # first paragraph that isn't a header??
-    blocks = [b.strip() for b in md.replace("\r", "").split("\n\n")]
-    first_para = next((b for b in blocks if b and not b.startswith("#")), "")
-    tldr = re.sub(r"[\n\r]+", " ", first_para)[:240]
-    return {"title": title, "tldr": tldr}
+    return parse_readme_lines(md.split("\n"))
+
+def parse_readme_lines(lines: Iterable[str]) -> Dict[str, str]:
+    """Title (first '# ' line) + TL;DR (first blank-line-separated block that isn't a header).
+    Consumes lines lazily and stops as soon as it has both."""
+    title = ""
+    tldr: Optional[str] = None
+    block: List[str] = []
+
+    def first_para(b: List[str]) -> Optional[str]:
+        text = "\n".join(b).strip()
+        if text and not text.startswith("#"):
+            return re.sub(r"[\n\r]+", " ", text)[:240]
+        return None
+
+    for line in lines:
+        line = line.replace("\r", "")
+        if not title:
+            m = re.match(r"#\s+(.+)$", line)
+            if m:
+                title = m.group(1).strip()
+        if tldr is None:
+            if line:
+                block.append(line)
+            else:
+                tldr = first_para(block)
+                block = []
+        if title and tldr is not None:
+            return {"title": title, "tldr": tldr}
+    if tldr is None:
+        tldr = first_para(block)
+    return {"title": title, "tldr": tldr or ""}
+
+def iter_response_lines(resp: requests.Response, max_bytes: int) -> Iterator[str]:
+    """Yield decoded lines from a streamed response, reading at most max_bytes off the wire."""
+    buf = b""
+    read = 0
+    for chunk in resp.iter_content(chunk_size=8192):
+        chunk = chunk[:max_bytes - read]
+        read += len(chunk)
+        buf += chunk
+        *lines, buf = buf.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8", "replace")
+        if read >= max_bytes:
+            break
+    if buf:
+        yield buf.decode("utf-8", "replace")
 
+@traced("repo")
 def fetch_repo_data(repo_url: str) -> Dict[str, Any]:
     m = re.search(r"github\.com/([^/]+)/([^/#?]+)", repo_url, flags=re.I)
     if not m:
         raise HTTPException(status_code=400, detail="Invalid GitHub URL. Expect https://github.com/owner/repo")
     owner, repo = m.group(1), m.group(2)
 
+    # READMEs can be huge (inline base64 images, giant tables) but we only need the top:
+    # ask for the first README_MAX_BYTES, stream it, and stop parsing once title + TL;DR are found
     headers_raw = {"Authorization": f"Bearer {GITHUB_TOKEN}"} if GITHUB_TOKEN else {}
-    readme = ""
-    for branch in ("main", "master"):
-        url = f"https://raw.githubusercontent.com/{owner}/{repo}/{branch}/README.md"
-        r = requests.get(url, headers=headers_raw, timeout=20)
-        if r.ok:
-            readme = r.text
-            break
+    headers_raw["Range"] = f"bytes=0-{README_MAX_BYTES - 1}"
+    meta = {"title": "", "tldr": ""}
+    degraded = False  # some GitHub host had its circuit open
+    try:
+        for branch in ("main", "master"):
+            url = f"https://raw.githubusercontent.com/{owner}/{repo}/{branch}/README.md"
+            r = upstream_request("GET", url, headers=headers_raw, timeout=20, stream=True, max_bytes=README_MAX_BYTES)
+            try:
+                if r.ok:  # 200, or 206 when the Range was honoured
+                    meta = parse_readme_lines(iter_response_lines(r, README_MAX_BYTES))
+                    break
+            finally:
+                r.close()
+    except CircuitOpen:
+        degraded = True
 
     api_headers = {"Accept": "application/vnd.github+json"}
     if GITHUB_TOKEN:
@@ -220,12 +1153,22 @@ def fetch_repo_data(repo_url: str) -> Dict[str, Any]:
         data = jfetch("GET", f"https://api.github.com/repos/{owner}/{repo}/commits?per_page=50", headers=api_headers)
         commits = [ (c.get("commit", {}) or {}).get("message","").split("\n")[0] for c in (data or []) if c.get("commit") ]
         commits = [c for c in commits if c]
+    except CircuitOpen:
+        degraded = True
     except HTTPException:
         # ignore if rate-limited or not found just use readme and deal with this later oop
         pass
 
-    meta = parse_readme(readme)
-    return {"readmeTitle": meta["title"], "readmeTLDR": meta["tldr"], "commits": commits}
+    stale_key = f"{owner}/{repo}".lower()
+    if degraded:
+        stale = STORE.get("repo_stale", stale_key)
+        if stale is not None:
+            return {**stale, "stale": True}
+
+    out = {"readmeTitle": meta["title"], "readmeTLDR": meta["tldr"], "commits": commits}
+    if not degraded:
+        STORE.set("repo_stale", stale_key, out, ttl=STALE_TTL_SEC)
+    return out
 
 def build_lyrics(readme_tldr: str, readme_title: str, commits: List[str]) -> str:
     chorus = (readme_tldr or readme_title or "ship it at HackMIT").strip()[:120]
@@ -256,19 +1199,47 @@ def build_lyrics(readme_tldr: str, readme_title: str, commits: List[str]) -> str
         bridge
     ])
 
+@traced("poll_complete")
 def wait_for_complete_clip(clip_id: str, timeout_sec: int = 180, interval_sec: int = 5):
     """Poll Suno /clips until status == 'complete' or timeout. Returns clip dict (may be non-complete on timeout)."""
     deadline = time.time() + max(5, timeout_sec)
-    headers = {"Authorization": f"Bearer {SUNO_TOKEN}"}
     last = None
+    polls = 0
     while time.time() < deadline:
-        data = jfetch("GET", f"{SUNO_BASE}/clips", headers=headers, params={"ids": clip_id})
-        last = data[0] if isinstance(data, list) and data else data
+        last = fetch_clip(clip_id)
+        polls += 1
         if last and last.get("status") == "complete":
+            CLIP_POLL_ITERATIONS.observe(polls, "complete", "reached")
             return last
         time.sleep(max(1, interval_sec))
+    CLIP_POLL_ITERATIONS.observe(polls, "complete", "timeout")
     return last or {}
 
+@traced("download")
+def download_mp3(url: str, filename: str, timeout: int = 60) -> str:
+    """Fetch an MP3 (following CDN redirects) into downloads/ and return its absolute path.
+    One worker runs each download job; the rest wait for it and reuse the file (the file is the cache)."""
+    path = os.path.abspath(os.path.join("downloads", filename))
+    if os.path.exists(path) and os.path.getsize(path) > 0:
+        return path
+
+    def _download() -> str:
+        t0 = time.perf_counter()
+        resp = upstream_request("GET", url, timeout=timeout, allow_redirects=True)
+        resp.raise_for_status()
+        if not resp.content:
+            raise HTTPException(status_code=502, detail=f"empty MP3 body from {url}")
+        os.makedirs("downloads", exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.part"
+        with open(tmp, "wb") as f:
+            f.write(resp.content)
+        os.replace(tmp, path)  # readers never see a half-written file
+        DOWNLOAD_BYTES.inc(amount=len(resp.content))
+        DOWNLOAD_LATENCY.observe(time.perf_counter() - t0)
+        return path
+
+    return coalesce_inflight("download", filename, _download, wait_sec=timeout)
+
 
 SPOTIFY_CLIENT_ID = os.getenv("SPOTIFY_CLIENT_ID", "")
 SPOTIFY_CLIENT_SECRET = os.getenv("SPOTIFY_CLIENT_SECRET", "")
@@ -362,6 +1333,8 @@ def fetch_recent_genres_and_features(access_token: str) -> Dict[str, Any]:
         try:
             arts = jfetch("GET", "https://api.spotify.com/v1/artists",
                           headers=headers, params={"ids": ",".join(chunk)})
+        except CircuitOpen:
+            raise
         except HTTPException:
             continue
         for a in arts.get("artists") or []:
@@ -371,21 +1344,12 @@ def fetch_recent_genres_and_features(access_token: str) -> Dict[str, Any]:
 
     # audio feats centroid from recent tracks
     features = {"tempo": 0.0, "energy": 0.0, "danceability": 0.0, "valence": 0.0, "count": 0}
-    for i in range(0, len(track_ids), 100):
-        chunk = track_ids[i:i+100]
-        try:
-            af = jfetch("GET", "https://api.spotify.com/v1/audio-features",
-                        headers=headers, params={"ids": ",".join(chunk)})
-        except HTTPException:
-            continue
-        for f in af.get("audio_features") or []:
-            if not f:
-                continue
-            features["tempo"] += f.get("tempo") or 0.0
-            features["energy"] += f.get("energy") or 0.0
-            features["danceability"] += f.get("danceability") or 0.0
-            features["valence"] += f.get("valence") or 0.0
-            features["count"] += 1
+    for f in fetch_audio_features(headers, track_ids):
+        features["tempo"] += f.get("tempo") or 0.0
+        features["energy"] += f.get("energy") or 0.0
+        features["danceability"] += f.get("danceability") or 0.0
+        features["valence"] += f.get("valence") or 0.0
+        features["count"] += 1
 
     if features["count"] > 0:
         for k in ("tempo", "energy", "danceability", "valence"):
@@ -403,6 +1367,8 @@ def features_from_recommendations(access_token: str, genres: List[str]) -> Dict[
     try:
         rec = jfetch("GET", "https://api.spotify.com/v1/recommendations",
                      headers=headers, params={"seed_genres": ",".join(seeds), "limit": 50})
+    except CircuitOpen:
+        raise
     except HTTPException:
         return {"tempo": 0.0, "energy": 0.0, "danceability": 0.0, "valence": 0.0, "count": 0}
 
@@ -412,20 +1378,12 @@ def features_from_recommendations(access_token: str, genres: List[str]) -> Dict[
         return {"tempo": 0.0, "energy": 0.0, "danceability": 0.0, "valence": 0.0, "count": 0}
 
     feats = {"tempo": 0.0, "energy": 0.0, "danceability": 0.0, "valence": 0.0, "count": 0}
-    for i in range(0, len(ids), 100):
-        chunk = ids[i:i+100]
-        try:
-            af = jfetch("GET", "https://api.spotify.com/v1/audio-features",
-                        headers=headers, params={"ids": ",".join(chunk)})
-        except HTTPException:
-            continue
-        for f in af.get("audio_features") or []:
-            if not f: continue
-            feats["tempo"] += f.get("tempo") or 0.0
-            feats["energy"] += f.get("energy") or 0.0
-            feats["danceability"] += f.get("danceability") or 0.0
-            feats["valence"] += f.get("valence") or 0.0
-            feats["count"] += 1
+    for f in fetch_audio_features(headers, ids):
+        feats["tempo"] += f.get("tempo") or 0.0
+        feats["energy"] += f.get("energy") or 0.0
+        feats["danceability"] += f.get("danceability") or 0.0
+        feats["valence"] += f.get("valence") or 0.0
+        feats["count"] += 1
 
     if feats["count"] > 0:
         for k in ("tempo", "energy", "danceability", "valence"):
@@ -436,37 +1394,67 @@ def features_from_recommendations(access_token: str, genres: List[str]) -> Dict[
 
 def poll_clip(clip_id: str, target: str = "complete", timeout_sec: int = 180, interval: float = 2.5) -> dict:
     """Poll Suno /clips until target status or timeout. Returns the clip object (may be last seen)."""
+    with span(f"poll_{target}"):
+        return _poll_clip(clip_id, target, timeout_sec, interval)
+
+def _poll_clip(clip_id: str, target: str, timeout_sec: int, interval: float) -> dict:
     deadline = time.time() + max(5, timeout_sec)
     last = {}
+    polls = 0
     while time.time() < deadline:
-        data = jfetch(
-            "GET",
-            f"{SUNO_BASE}/clips",
-            headers={"Authorization": f"Bearer {SUNO_TOKEN}"},
-            params={"ids": clip_id},
-        )
-        if isinstance(data, list) and data:
-            last = data[0]
+        clip = fetch_clip(clip_id)
+        polls += 1
+        if isinstance(clip, dict) and clip:
+            last = clip
             status = (last.get("status") or "").lower()
             if status == target:
+                CLIP_POLL_ITERATIONS.observe(polls, target, "reached")
                 return last
             # If caller wants streaming URL ASAP
             if target == "streaming" and status in ("streaming", "complete"):
+                CLIP_POLL_ITERATIONS.observe(polls, target, "reached")
                 return last
             # If target is complete and we already got complete, return
             if target == "complete" and status == "complete":
+                CLIP_POLL_ITERATIONS.observe(polls, target, "reached")
                 return last
         time.sleep(interval)
+    CLIP_POLL_ITERATIONS.observe(polls, target, "timeout")
     return last  # timeout: best-effort return
 
 
 # --- routes ---
 
+@app.middleware("http")
+async def observe_request(request: Request, call_next):
+    t0 = time.perf_counter()
+    status = "500"
+    trace = Trace(f"{request.method} {request.url.path}")
+    try:
+        with use_trace(trace):
+            response = await call_next(request)
+        status = str(response.status_code)
+        # for SSE this only covers the pre-stream work; per-track timings ride in the event payloads
+        response.headers["Server-Timing"] = trace.server_timing()
+        return response
+    finally:
+        # label by route template (/api/clip/{clip_id}), not raw path, to keep cardinality bounded
+        route = request.scope.get("route")
+        route_path = getattr(route, "path", "unmatched")
+        HTTP_REQUESTS.inc(request.method, route_path, status)
+        HTTP_LATENCY.observe(time.perf_counter() - t0, request.method, route_path)
+        finish_trace(trace, route=route_path, status=status)
+
 @app.post("/api/team-anthem")
-def team_anthem(body: TeamAnthemBody):
+async def team_anthem(body: TeamAnthemBody, request: Request):
     if not body.users:
         raise HTTPException(status_code=400, detail="No users provided")
 
+    # queue on the event loop; only admitted requests take a threadpool thread
+    async with ANTHEM_GATE.admit(client_key(request, body.users)):
+        return await run_in_threadpool(_team_anthem, body)
+
+def _team_anthem(body: TeamAnthemBody):
     per_user = [fetch_spotify_taste(u.accessToken) for u in body.users]
     fused = fuse_tags(per_user, body.mood, body.instrumental)
 
@@ -474,16 +1462,11 @@ def team_anthem(body: TeamAnthemBody):
             f"{('Inside jokes: ' + body.insideJokes) if body.insideJokes else ''}"
     topic = topic[:480]
 
-    gen = jfetch(
-        "POST",
-        f"{SUNO_BASE}/generate",
-        headers={"Authorization": f"Bearer {SUNO_TOKEN}", "Content-Type": "application/json"},
-        json={
-            "topic": topic,
-            "tags": fused["tagStr"],
-            "make_instrumental": fused["makeInstrumental"],
-        },
-    )
+    gen = suno_generate({
+        "topic": topic,
+        "tags": fused["tagStr"],
+        "make_instrumental": fused["makeInstrumental"],
+    })
 
     return {
         "clipId": gen.get("id"),
@@ -493,17 +1476,22 @@ def team_anthem(body: TeamAnthemBody):
     }
 
 @app.get("/api/clip/{clip_id}")
-def get_clip(clip_id: str):
-    data = jfetch(
-        "GET",
-        f"{SUNO_BASE}/clips",
-        headers={"Authorization": f"Bearer {SUNO_TOKEN}"},
-        params={"ids": clip_id},
-    )
-    # return array of clip objs
-    if isinstance(data, list) and data:
-        return data[0]
-    return data
+def get_clip(clip_id: str, request: Request):
+    clip = fetch_clip(clip_id)
+    # unknown clip keeps the old empty-array shape
+    return clip_response(request, clip or [], immutable=_is_complete(clip))
+
+@app.get("/api/clips")
+def get_clips(request: Request, ids: str = Query(..., description="comma-separated clip ids")):
+    """Batch status: cached clips resolve locally, the rest cost one Suno call. Keeps request order."""
+    clip_ids = list(dict.fromkeys(i.strip() for i in ids.split(",") if i.strip()))
+    if not clip_ids:
+        raise HTTPException(400, "ids required")
+    if len(clip_ids) > 100:
+        raise HTTPException(400, "At most 100 ids per request")
+    found = fetch_clips(clip_ids)
+    clips = [found[cid] for cid in clip_ids if cid in found]
+    return clip_response(request, clips, immutable=len(clips) == len(clip_ids) and all(map(_is_complete, clips)))
 
 @app.post("/api/songify")
 def songify(body: SongifyBody):
@@ -514,15 +1502,10 @@ def songify(body: SongifyBody):
     provided = [t.strip() for t in (body.tags or "").split(",") if t and t.strip()]
     final_tags = ", ".join(list(dict.fromkeys((provided + mood_tags)))[:6])
 
-    gen = jfetch(
-        "POST",
-        f"{SUNO_BASE}/generate",
-        headers={"Authorization": f"Bearer {SUNO_TOKEN}", "Content-Type": "application/json"},
-        json={
-            "prompt": prompt,#custom lyrics
-            "tags": final_tags
-        },
-    )
+    gen = suno_generate({
+        "prompt": prompt,#custom lyrics
+        "tags": final_tags
+    })
 
     return {
         "clipId": gen.get("id"),
@@ -546,16 +1529,11 @@ def team_anthem_debug(body: DebugAnthemBody):
     topic = (body.topic or "An anthem for HackMIT hackers.").strip()[:480]
     tag_str = ", ".join([t.strip() for t in body.tags.split(",") if t.strip()])[:100]
 
-    gen = jfetch(
-        "POST",
-        f"{SUNO_BASE}/generate",
-        headers={"Authorization": f"Bearer {SUNO_TOKEN}", "Content-Type": "application/json"},
-        json={
-            "topic": topic,
-            "tags": tag_str,
-            **({"make_instrumental": body.make_instrumental} if body.make_instrumental is not None else {})
-        },
-    )
+    gen = suno_generate({
+        "topic": topic,
+        "tags": tag_str,
+        **({"make_instrumental": body.make_instrumental} if body.make_instrumental is not None else {})
+    })
     return {"clipId": gen.get("id"), "tags": tag_str, "topic": topic, "make_instrumental": body.make_instrumental}
 
 
@@ -584,14 +1562,7 @@ def wait_and_save(body: WaitAndSaveBody):
         }
 
     if body.download and audio_url:
-        downloads_dir = pathlib.Path("downloads")
-        downloads_dir.mkdir(exist_ok=True)
-        fname = downloads_dir / f"hacktrack_{body.clipId}.mp3"
-        # follow redirects to CDN
-        resp = requests.get(audio_url, timeout=180, allow_redirects=True)
-        resp.raise_for_status()
-        fname.write_bytes(resp.content)
-        saved_path = str(fname.resolve())
+        saved_path = download_mp3(audio_url, f"hacktrack_{body.clipId}.mp3", timeout=180)
 
     return {
         "clipId": body.clipId,
@@ -631,6 +1602,16 @@ def root():
 def healthz():
     return {"status": "ok"}
 
+@app.on_event("startup")
+def start_metrics_publisher():
+    # runs in each worker (not the supervisor), so every pid keeps its snapshot fresh
+    if WORKERS > 1:
+        threading.Thread(target=_metrics_publisher, name="jam-metrics", daemon=True).start()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 from fastapi import Query
 from pydantic import BaseModel
 from typing import Optional
@@ -694,10 +1675,16 @@ class HackJamOnceBody(BaseModel):
     delayBetweenSec: float = 1.0   # small pacing between requests
 
 @app.post("/api/hackjam-once")
-def hackjam_once(body: HackJamOnceBody):
+async def hackjam_once(body: HackJamOnceBody, request: Request):
     if not body.users:
         raise HTTPException(400, "At least one Spotify user accessToken is required")
 
+    # fewer tracks per request while we're busy
+    body.count = min(max(1, body.count), HACKJAM_ONCE_GATE.scaled_limit(MAX_ONCE_COUNT))
+    async with HACKJAM_ONCE_GATE.admit(client_key(request, body.users)):
+        return await run_in_threadpool(_hackjam_once, body)
+
+def _hackjam_once(body: HackJamOnceBody):
     # 1) Gather per-user taste and fuse into tags/mode
     per_user = [fetch_spotify_taste(u.accessToken) for u in body.users]
     fused = fuse_tags(per_user, body.mood, body.instrumental)
@@ -710,16 +1697,11 @@ def hackjam_once(body: HackJamOnceBody):
     results = []
     for i in range(max(1, body.count)):
         # 2) Fire Suno generation
-        gen = jfetch(
-            "POST",
-            f"{SUNO_BASE}/generate",
-            headers={"Authorization": f"Bearer {SUNO_TOKEN}", "Content-Type": "application/json"},
-            json={
-                "topic": (topic_base + f" Track {i+1}").strip()[:480],
-                "tags": fused["tagStr"],
-                "make_instrumental": fused["makeInstrumental"],
-            },
-        )
+        gen = suno_generate({
+            "topic": (topic_base + f" Track {i+1}").strip()[:480],
+            "tags": fused["tagStr"],
+            "make_instrumental": fused["makeInstrumental"],
+        })
         clip_id = gen.get("id")
         if not clip_id:
             raise HTTPException(500, "Suno did not return a clip id")
@@ -737,17 +1719,15 @@ def hackjam_once(body: HackJamOnceBody):
                 "duration": (final.get("metadata") or {}).get("duration"),
             })
             if body.download and item.get("audio_url", "").endswith(".mp3"):
-                mp3 = requests.get(item["audio_url"], timeout=60)
-                mp3.raise_for_status()
-                os.makedirs("downloads", exist_ok=True)
-                path = os.path.abspath(os.path.join("downloads", f"hackjam_{clip_id}.mp3"))
-                with open(path, "wb") as f:
-                    f.write(mp3.content)
-                item["saved_path"] = path
+                item["saved_path"] = download_mp3(item["audio_url"], f"hackjam_{clip_id}.mp3")
             time.sleep(body.delayBetweenSec)
         results.append(item)
 
-    return {"count": len(results), "tracks": results, "make_instrumental": fused["makeInstrumental"]}
+    # remember the tracks so /api/mixtape/{sessionId} can splice them into one file later
+    session_id = uuid.uuid4().hex
+    for item in results:
+        record_mixtape_track(session_id, item["clipId"], item.get("saved_path"), item.get("audio_url"))
+    return {"count": len(results), "tracks": results, "make_instrumental": fused["makeInstrumental"], "sessionId": session_id}
 
 class HackJamStreamBody(BaseModel):
     users: List[SpotifyUser]
@@ -760,94 +1740,503 @@ class HackJamStreamBody(BaseModel):
     delayBetweenSec: float = 1.0
     saveEach: bool = False
 
-def _sse(data: dict) -> str:
+def _sse(data: dict, event_id: Optional[str] = None) -> str:
+    if event_id:
+        return f"id: {event_id}\ndata: {json.dumps(data)}\n\n"
     return f"data: {json.dumps(data)}\n\n"
 
-@app.post("/api/hackjam-stream")
-def hackjam_stream(body: HackJamStreamBody):
-    if not body.users:
-        raise HTTPException(400, "At least one Spotify user accessToken is required")
-
-    per_user = [fetch_spotify_taste(u.accessToken) for u in body.users]
-    fused = fuse_tags(per_user, body.mood, body.instrumental)
-    topic_base = f"An anthem for {body.teamName} at HackMIT. Mood: {body.mood}. "
-    if body.insideJokes:
-        topic_base += f"Inside jokes: {body.insideJokes[:120]}"
-    topic_base = topic_base[:480]
-
-    start_time = time.time()
-
-    def gen():
+# --- hackjam stream sessions ---
+# a session runs its generation loop in its own thread and keeps a bounded event log, so a dropped
+# connection doesn't kill it: reconnecting with Last-Event-ID ("<sessionId>:<seq>") replays what was
+# missed and follows the live session without profiling or generating anything new.
+# the log is mirrored into STORE so a reconnect that lands on another worker can still tail it.
+#
+# it's also a broadcast hub: teammates opening the same team's stream join the live session, and
+# every listener is an async subscriber with its own bounded queue. the producer never blocks on a
+# listener; a subscriber whose queue overflows is flagged and catches up from the event log instead.
+SESSION_LOG_SIZE = 200
+SUBSCRIBER_QUEUE_SIZE = 64
+SESSION_TTL_SEC = 30 * 60      # finished sessions stay replayable this long
+SESSION_STALE_SEC = 10 * 60    # remote tail gives up if the owning worker stops publishing
+SSE_KEEPALIVE_SEC = 15
+
+class StreamSession:
+    def __init__(self, body: HackJamStreamBody, fused: Dict[str, Any], topic_base: str):
+        self.id = uuid.uuid4().hex
+        self.body, self.fused, self.topic_base = body, fused, topic_base
+        self.events: deque = deque(maxlen=SESSION_LOG_SIZE)  # (seq, data)
+        self.seq = 0
+        self.done = False
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.team_key: Optional[str] = None
+        self.admission: Optional[tuple] = None  # (gate, client) slot to hand back when done
+        self.subscribers: set = set()
+        self.lock = threading.Lock()
+
+    def publish(self, data: Dict[str, Any]) -> None:
+        with self.lock:
+            self.seq += 1
+            item = (self.seq, data)
+            self.events.append(item)
+            if data.get("type") == "session" and data.get("event") == "end":
+                self.done = True
+                self.finished_at = time.time()
+            snapshot = {"events": list(self.events), "done": self.done, "updated_at": time.time()}
+            for sub in list(self.subscribers):
+                sub.offer(item)
+        STORE.set("stream_session", self.id, snapshot, ttl=SESSION_TTL_SEC)
+
+    def events_after(self, seq: int) -> List[tuple]:
+        with self.lock:
+            return [(s, d) for s, d in self.events if s > seq]
+
+    def attach(self, sub: "_Subscriber", after_seq: int) -> List[tuple]:
+        """Register a subscriber and hand back its backlog; nothing published in between is lost."""
+        with self.lock:
+            self.subscribers.add(sub)
+            return [(s, d) for s, d in self.events if s > after_seq]
+
+    def detach(self, sub: "_Subscriber") -> None:
+        with self.lock:
+            self.subscribers.discard(sub)
+
+    def start(self) -> None:
+        threading.Thread(target=self._run, name=f"hackjam-{self.id[:8]}", daemon=True).start()
+
+    def _run(self) -> None:
+        STREAM_SESSIONS_LIVE.inc()
+        tracks_done = 0
+        try:
+            tracks_done = self._produce()
+        except Exception as e:
+            self.publish({"type": "error", "message": str(getattr(e, "detail", e))})
+        finally:
+            STREAM_SESSIONS_LIVE.dec()
+            if self.admission:
+                gate, client = self.admission
+                gate.release(client, time.time() - self.started_at)
+            if self.team_key:
+                STORE.delete("stream_team", self.team_key)
+            self.publish({"type": "session", "event": "end", "sessionId": self.id, "tracks_done": tracks_done})
+
+    def _produce(self) -> int:
+        body, fused, topic_base = self.body, self.fused, self.topic_base
+        start_time = time.time()
         # session start
-        yield _sse({"type": "session", "event": "start", "tags": fused["tagStr"], "explain": fused["explain"]})
+        self.publish({"type": "session", "event": "start", "sessionId": self.id, "tags": fused["tagStr"], "explain": fused["explain"], "maxTracks": body.maxTracks})
         tracks_done = 0
 
         while tracks_done < max(1, body.maxTracks) and (time.time() - start_time) < body.maxMinutes * 60:
-            # submit a new generation
-            gen = jfetch(
-                "POST",
-                f"{SUNO_BASE}/generate",
-                headers={"Authorization": f"Bearer {SUNO_TOKEN}", "Content-Type": "application/json"},
-                json={
-                    "topic": (topic_base + f" Track {tracks_done+1}").strip()[:480],
+            # one trace per track, its stage timings ride along in the events
+            with use_trace(Trace(f"hackjam-stream track {tracks_done+1}")) as trace:
+                # submit a new generation
+                gen = suno_generate({
+                    "topic": (self.topic_base + f" Track {tracks_done+1}").strip()[:480],
                     "tags": fused["tagStr"],
                     "make_instrumental": fused["makeInstrumental"],
-                },
-            )
-            clip_id = gen.get("id")
-            if not clip_id:
-                yield _sse({"type": "error", "message": "No clip id from Suno"})
-                break
-
-            yield _sse({"type": "track", "stage": "submitted", "clipId": clip_id, "index": tracks_done+1})
-
-            # get streaming URL asap
-            st = poll_clip(clip_id, target="streaming", timeout_sec=90)
-            if st:
-                yield _sse({
+                })
+                clip_id = gen.get("id")
+                if not clip_id:
+                    self.publish({"type": "error", "message": "No clip id from Suno"})
+                    break
+
+                self.publish({"type": "track", "stage": "submitted", "clipId": clip_id, "index": tracks_done+1, "timing": trace.stages()})
+
+                # get streaming URL asap
+                st = poll_clip(clip_id, target="streaming", timeout_sec=90)
+                if st:
+                    self.publish({
+                        "type": "track",
+                        "stage": "streaming",
+                        "clipId": clip_id,
+                        "index": tracks_done+1,
+                        "stream_url": st.get("audio_url"),
+                        "image_url": st.get("image_url"),
+                        "title": st.get("title") or f"HackJam Track {tracks_done+1}",
+                        "timing": trace.stages(),
+                    })
+
+                # wait until complete
+                fin = poll_clip(clip_id, target="complete", timeout_sec=180)
+                payload = {
                     "type": "track",
-                    "stage": "streaming",
+                    "stage": "complete",
                     "clipId": clip_id,
                     "index": tracks_done+1,
-                    "stream_url": st.get("audio_url"),
-                    "image_url": st.get("image_url"),
-                    "title": st.get("title") or f"HackJam Track {tracks_done+1}",
-                })
-
-            # wait until complete
-            fin = poll_clip(clip_id, target="complete", timeout_sec=180)
-            payload = {
-                "type": "track",
-                "stage": "complete",
-                "clipId": clip_id,
-                "index": tracks_done+1,
-                "audio_url": fin.get("audio_url"),
-                "title": fin.get("title"),
-                "image_url": fin.get("image_url"),
-                "duration": (fin.get("metadata") or {}).get("duration"),
-            }
-
-            # optional save
-            if body.saveEach and payload.get("audio_url", "").endswith(".mp3"):
-                try:
-                    mp3 = requests.get(payload["audio_url"], timeout=60)
-                    mp3.raise_for_status()
-                    os.makedirs("downloads", exist_ok=True)
-                    path = os.path.abspath(os.path.join("downloads", f"hackjam_{clip_id}.mp3"))
-                    with open(path, "wb") as f:
-                        f.write(mp3.content)
-                    payload["saved_path"] = path
-                except Exception as e:
-                    payload["save_error"] = str(e)
-
-            yield _sse(payload)
+                    "audio_url": fin.get("audio_url"),
+                    "title": fin.get("title"),
+                    "image_url": fin.get("image_url"),
+                    "duration": (fin.get("metadata") or {}).get("duration"),
+                }
+
+                # optional save
+                if body.saveEach and (payload.get("audio_url") or "").endswith(".mp3"):
+                    try:
+                        payload["saved_path"] = download_mp3(payload["audio_url"], f"hackjam_{clip_id}.mp3")
+                    except Exception as e:
+                        payload["save_error"] = str(e)
+
+                payload["timing"] = {**trace.stages(), "total": round(trace.total_ms(), 1)}
+                finish_trace(trace, route="/api/hackjam-stream", clipId=clip_id)
+            record_mixtape_track(self.id, clip_id, payload.get("saved_path"), payload.get("audio_url"))
+            self.publish(payload)
 
             tracks_done += 1
             time.sleep(max(0.2, body.delayBetweenSec))
 
-        yield _sse({"type": "session", "event": "end", "tracks_done": tracks_done})
+        return tracks_done
+
+class _Subscriber:
+    """One listener. offer() is called from the producer thread and hops onto the listener's loop."""
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.lagged = False
+
+    def offer(self, item: tuple) -> None:
+        try:
+            self.loop.call_soon_threadsafe(self._put, item)
+        except RuntimeError:
+            pass  # listener's loop is gone
+
+    def _put(self, item: tuple) -> None:
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.lagged = True
+
+_sessions: Dict[str, StreamSession] = {}
+_sessions_lock = threading.Lock()
+
+def _register_session(session: StreamSession) -> None:
+    now = time.time()
+    with _sessions_lock:
+        for sid in [sid for sid, s in _sessions.items() if s.finished_at and now - s.finished_at > SESSION_TTL_SEC]:
+            del _sessions[sid]
+        _sessions[session.id] = session
+
+def _parse_event_id(event_id: Optional[str]) -> Optional[tuple]:
+    if not event_id or ":" not in event_id:
+        return None
+    sid, _, seq = event_id.rpartition(":")
+    return (sid, int(seq)) if seq.isdigit() else None
+
+def _session_exists(session_id: str) -> bool:
+    return session_id in _sessions or STORE.get("stream_session", session_id) is not None
+
+def _team_key(body: HackJamStreamBody) -> str:
+    # same team + same vibe = same session, whoever opens it
+    users = sorted(_token_key(u.accessToken) for u in body.users)
+    raw = json.dumps([body.teamName.strip().lower(), body.mood, body.instrumental, body.insideJokes, users])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def _live_team_session(team_key: str) -> Optional[str]:
+    sid = STORE.get("stream_team", team_key)
+    if not sid:
+        return None
+    snap = STORE.get("stream_session", sid)
+    if snap is not None and snap["done"]:
+        STORE.delete("stream_team", team_key)
+        return None
+    return sid
+
+async def _follow_local(session: StreamSession, after_seq: int):
+    sub = _Subscriber(asyncio.get_running_loop())
+    pending = session.attach(sub, after_seq)
+    last = after_seq
+    try:
+        while True:
+            for seq, data in pending:
+                if seq <= last:
+                    continue
+                last = seq
+                yield _sse(data, f"{session.id}:{seq}")
+            if session.done and session.seq <= last:
+                return
+            if sub.lagged:
+                # fell behind: drop the queue and catch up from the log
+                sub.lagged = False
+                while not sub.queue.empty():
+                    sub.queue.get_nowait()
+                pending = session.events_after(last)
+                continue
+            try:
+                pending = [await asyncio.wait_for(sub.queue.get(), SSE_KEEPALIVE_SEC)]
+            except asyncio.TimeoutError:
+                pending = []
+                yield ": keepalive\n\n"
+    finally:
+        session.detach(sub)
+
+async def _follow_remote(session_id: str, after_seq: int):
+    # the producer lives in another worker: tail its mirrored log
+    last = after_seq
+    idle_since = time.time()
+    while True:
+        # sqlite read + JSON decode of the whole log: keep it off the event loop
+        snap = await run_in_threadpool(STORE.get, "stream_session", session_id)
+        if snap is None:
+            return
+        pending = [(seq, data) for seq, data in snap["events"] if seq > last]
+        for seq, data in pending:
+            last = seq
+            yield _sse(data, f"{session_id}:{seq}")
+        if snap["done"]:
+            return
+        if time.time() - snap["updated_at"] > SESSION_STALE_SEC:
+            yield _sse({"type": "error", "message": "session owner stopped responding"})
+            return
+        if pending:
+            idle_since = time.time()
+        elif time.time() - idle_since > SSE_KEEPALIVE_SEC:
+            idle_since = time.time()
+            yield ": keepalive\n\n"
+        await asyncio.sleep(0.5)
+
+async def follow_session(session_id: str, after_seq: int = 0):
+    """SSE generator: replay events after after_seq, then follow the session live."""
+    SSE_INFLIGHT.inc()
+    try:
+        session = _sessions.get(session_id)
+        follow = _follow_local(session, after_seq) if session is not None else _follow_remote(session_id, after_seq)
+        async for chunk in follow:
+            yield chunk
+    finally:
+        SSE_INFLIGHT.dec()
+
+def _start_session(body: HackJamStreamBody, team_key: str, client: str, owned: List[bool]) -> str:
+    # the caller holds a STREAM_GATE slot; the session keeps it for its whole life and its
+    # producer thread releases it. owned tells the caller the slot is no longer theirs to release
+    per_user = [fetch_spotify_taste(u.accessToken) for u in body.users]
+    fused = fuse_tags(per_user, body.mood, body.instrumental)
+    topic_base = f"An anthem for {body.teamName} at HackMIT. Mood: {body.mood}. "
+    if body.insideJokes:
+        topic_base += f"Inside jokes: {body.insideJokes[:120]}"
+    topic_base = topic_base[:480]
+
+    session = StreamSession(body, fused, topic_base)
+    session.team_key = team_key
+    session.admission = (STREAM_GATE, client)
+    _register_session(session)
+    owned.append(True)
+    session.start()
+    return session.id
+
+async def _join_team_session(team_key: str, wait_sec: float = 60) -> Optional[str]:
+    """The team's live session id, waiting out a teammate's session that is still starting (any worker)."""
+    deadline = time.time() + wait_sec
+    while True:
+        sid = await run_in_threadpool(_live_team_session, team_key)
+        if sid or time.time() >= deadline:
+            return sid
+        if await run_in_threadpool(STORE.get, "stream_team:inflight", team_key) is None:
+            return await run_in_threadpool(_live_team_session, team_key)  # it may have just published
+        await asyncio.sleep(0.2)
+
+@app.post("/api/hackjam-stream")
+async def hackjam_stream(body: HackJamStreamBody, request: Request, last_event_id: Optional[str] = Header(None)):
+    # reconnect: pick the live session back up instead of starting (and paying for) a new one
+    resume = _parse_event_id(last_event_id)
+    if resume and await run_in_threadpool(_session_exists, resume[0]):
+        return StreamingResponse(follow_session(*resume), media_type="text/event-stream")
+
+    if not body.users:
+        raise HTTPException(400, "At least one Spotify user accessToken is required")
+
+    # one producer per team: join the live session if a teammate already started it (on any worker)
+    team_key = _team_key(body)
+    # (wait before taking a gate slot: teammates share users[0], so they'd be shed as the same client)
+    session_id = await _join_team_session(team_key)
+    if not session_id:
+        body.maxTracks = min(max(1, body.maxTracks), STREAM_GATE.scaled_limit(MAX_STREAM_TRACKS))
+        client = client_key(request, body.users)
+        try:
+            await STREAM_GATE.acquire(client)
+        except HTTPException:
+            # a teammate may have claimed the session between our check and acquire: join theirs instead
+            await asyncio.sleep(0.2)
+            session_id = await _join_team_session(team_key)
+            if not session_id:
+                raise
+            return StreamingResponse(follow_session(session_id), media_type="text/event-stream")
+        owned: List[bool] = []
+        try:
+            session_id = await run_in_threadpool(
+                shared_once, "stream_team", team_key, lambda: _start_session(body, team_key, client, owned),
+                ttl=max(1, body.maxMinutes) * 60 + SESSION_TTL_SEC,
+            )
+        finally:
+            if not owned:  # failed, or a teammate's session won the race: hand the slot back
+                STREAM_GATE.release(client)
+    return StreamingResponse(follow_session(session_id), media_type="text/event-stream")
+
+@app.get("/api/hackjam-stream/{session_id}")
+def hackjam_stream_attach(session_id: str, last_event_id: Optional[str] = Header(None), after: int = Query(0)):
+    """Re-attach to a running (or recently finished) session, EventSource-friendly."""
+    if not _session_exists(session_id):
+        raise HTTPException(404, "Unknown or expired session")
+    resume = _parse_event_id(last_event_id)
+    after_seq = resume[1] if resume and resume[0] == session_id else after
+    return StreamingResponse(follow_session(session_id, after_seq), media_type="text/event-stream")
+
+# --- mp3 mixtape ---
+# one continuous MP3 for a whole session without decoding anything: walk each saved track's MPEG
+# frames (mmap'd), drop the ID3/APE tags and the Xing/Info header frame, and stream the raw frame
+# bytes back to back. that's a valid stream as long as every track shares the same MPEG version,
+# layer, sample rate and channel mode, but it isn't gapless: layer III frames borrow bytes from the
+# frames before them (the bit reservoir), so the first frame or two after each join can glitch, and
+# dropping the LAME/Xing frame loses the encoder delay/padding, so each join keeps that silence.
+MIXTAPE_CHUNK_BYTES = 256 * 1024
+
+_MPEG_BITRATES = {  # kbps, by (is MPEG-1, layer)
+    (True, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (False, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_MPEG_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}  # by version bits
+
+def record_mixtape_track(session_id: str, clip_id: str, saved_path: Optional[str], audio_url: Optional[str]) -> None:
+    tracks = STORE.get("mixtape", session_id) or []
+    tracks.append({"clipId": clip_id, "path": saved_path, "audio_url": audio_url})
+    STORE.set("mixtape", session_id, tracks, ttl=7 * 24 * 3600)
+
+def _mp3_frame(buf, pos: int, end: int) -> Optional[tuple]:
+    """(frame length, format) if a valid MPEG audio frame header starts at pos, else None."""
+    if pos + 4 > end or buf[pos] != 0xFF or (buf[pos + 1] & 0xE0) != 0xE0:
+        return None
+    b1, b2, b3 = buf[pos + 1], buf[pos + 2], buf[pos + 3]
+    version, layer_bits = (b1 >> 3) & 3, (b1 >> 1) & 3
+    bitrate_idx, rate_idx, padding = b2 >> 4, (b2 >> 2) & 3, (b2 >> 1) & 1
+    if version == 1 or layer_bits == 0 or bitrate_idx in (0, 15) or rate_idx == 3:
+        return None  # reserved values (and free-format, which we don't splice)
+    layer, mpeg1 = 4 - layer_bits, version == 3
+    bitrate = _MPEG_BITRATES[(mpeg1, layer)][bitrate_idx] * 1000
+    rate = _MPEG_SAMPLE_RATES[version][rate_idx]
+    if layer == 1:
+        length = (12 * bitrate // rate + padding) * 4
+    elif layer == 3 and not mpeg1:
+        length = 72 * bitrate // rate + padding
+    else:
+        length = 144 * bitrate // rate + padding
+    mono = (b3 >> 6) == 3
+    return length, (version, layer, rate, mono)
+
+def _is_vbr_header_frame(buf, pos: int, length: int) -> bool:
+    head = bytes(buf[pos:pos + min(length, 64)])
+    return b"Xing" in head or b"Info" in head or b"VBRI" in head
+
+def mp3_audio_ranges(buf) -> tuple:
+    """([(start, end), ...] byte ranges holding audio frames, format) for an mmap'd MP3."""
+    end = len(buf)
+    pos = 0
+    while buf[pos:pos + 3] == b"ID3" and pos + 10 <= end:  # ID3v2 (possibly several)
+        size = ((buf[pos + 6] & 0x7F) << 21) | ((buf[pos + 7] & 0x7F) << 14) | ((buf[pos + 8] & 0x7F) << 7) | (buf[pos + 9] & 0x7F)
+        pos += 10 + size + (10 if buf[pos + 5] & 0x10 else 0)
+    if end >= 128 and buf[end - 128:end - 125] == b"TAG":  # ID3v1
+        end -= 128
+    if end - pos >= 32 and buf[end - 32:end - 24] == b"APETAGEX":  # APEv2 footer (sits before any ID3v1)
+        size = int.from_bytes(buf[end - 20:end - 16], "little")  # items + footer
+        has_header = int.from_bytes(buf[end - 12:end - 8], "little") & 0x80000000
+        end = max(pos, end - size - (32 if has_header else 0))
+
+    ranges: List[List[int]] = []
+    fmt = None
+    first = True
+    while pos < end:
+        frame = _mp3_frame(buf, pos, end)
+        # outside a run of frames, only trust a sync word that's followed by another frame
+        if frame and not (ranges and ranges[-1][1] == pos):
+            nxt = pos + frame[0]
+            if nxt < end and not _mp3_frame(buf, nxt, end):
+                frame = None
+        if not frame or pos + frame[0] > end:
+            nxt_sync = buf.find(b"\xff", pos + 1, end)
+            if nxt_sync < 0:
+                break
+            pos = nxt_sync
+            continue
+        length, frame_fmt = frame
+        fmt = fmt or frame_fmt
+        if first and _is_vbr_header_frame(buf, pos, length):
+            pos, first = pos + length, False  # its frame count/TOC would be wrong for the mixtape
+            continue
+        first = False
+        if ranges and ranges[-1][1] == pos:
+            ranges[-1][1] = pos + length
+        else:
+            ranges.append([pos, pos + length])
+        pos += length
+    return [tuple(r) for r in ranges], fmt
+
+def _mixtape_tracks(session_id: str) -> List[Dict[str, Any]]:
+    tracks = STORE.get("mixtape", session_id)
+    if tracks is None:
+        raise HTTPException(404, "Unknown session (or it produced no tracks)")
+    # hackjam-once with wait=false records tracks before they have audio: look those up in one /clips call
+    missing = [t["clipId"] for t in tracks if not t.get("audio_url") and not (t.get("path") and os.path.exists(t["path"]))]
+    if missing:
+        try:
+            clips = fetch_clips(missing)
+        except Exception:
+            clips = {}
+        tracks = [{**t, "audio_url": t.get("audio_url") or (clips.get(t["clipId"]) or {}).get("audio_url")} for t in tracks]
+    out = []
+    for t in tracks:
+        path = t.get("path")
+        if not (path and os.path.exists(path)) and (t.get("audio_url") or "").endswith(".mp3"):
+            # not saved during the session: fetch it now (once, shared with other workers)
+            try:
+                path = download_mp3(t["audio_url"], f"hackjam_{t['clipId']}.mp3")
+            except Exception:
+                path = None
+        # an empty file (failed download) can't be mmap'd and has nothing to splice anyway
+        out.append({**t, "path": path if path and os.path.exists(path) and os.path.getsize(path) > 0 else None})
+    return out
 
-    return StreamingResponse(gen(), media_type="text/event-stream")
+@app.get("/api/mixtape/{session_id}")
+def mixtape(session_id: str):
+    """Stream a session's tracks as one MP3, spliced at frame boundaries (no re-encode, so not gapless)."""
+    parts, skipped = [], []
+    fmt = None
+    try:
+        for t in _mixtape_tracks(session_id):
+            if not t["path"]:
+                skipped.append(t["clipId"])
+                continue
+            with open(t["path"], "rb") as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            ranges, track_fmt = mp3_audio_ranges(mm)
+            if not ranges or (fmt and track_fmt != fmt):
+                skipped.append(t["clipId"])  # can't splice mismatched streams without re-encoding
+                mm.close()
+                continue
+            fmt = fmt or track_fmt
+            parts.append((mm, ranges))
+        if not parts:
+            raise HTTPException(404, "No saved tracks to mix for this session")
+    except BaseException:
+        for mm, _ in parts:  # body() never runs, so it won't close them
+            mm.close()
+        raise
+
+    def body():
+        try:
+            for mm, ranges in parts:
+                for start, end in ranges:
+                    for off in range(start, end, MIXTAPE_CHUNK_BYTES):
+                        yield mm[off:min(end, off + MIXTAPE_CHUNK_BYTES)]
+        finally:
+            for mm, _ in parts:
+                mm.close()
+
+    headers = {"Content-Disposition": f'inline; filename="mixtape_{session_id}.mp3"'}
+    if skipped:
+        headers["X-Mixtape-Skipped"] = ",".join(skipped)
+    return StreamingResponse(body(), media_type="audio/mpeg", headers=headers)
 
 class RepoJamOnceBody(BaseModel):
     repoUrl: str
@@ -869,12 +2258,7 @@ def repojam_once(body: RepoJamOnceBody):
     final_tags = ", ".join(list(dict.fromkeys((provided + mood_tags)))[:6])
 
     # 2) Generate
-    gen = jfetch(
-        "POST",
-        f"{SUNO_BASE}/generate",
-        headers={"Authorization": f"Bearer {SUNO_TOKEN}", "Content-Type": "application/json"},
-        json={"prompt": prompt, "tags": final_tags},
-    )
+    gen = suno_generate({"prompt": prompt, "tags": final_tags})
     clip_id = gen.get("id")
     out = {
         "clipId": clip_id,
@@ -894,13 +2278,7 @@ def repojam_once(body: RepoJamOnceBody):
             "duration": (fin.get("metadata") or {}).get("duration"),
         })
         if body.download and out.get("audio_url", "").endswith(".mp3"):
-            mp3 = requests.get(out["audio_url"], timeout=60)
-            mp3.raise_for_status()
-            os.makedirs("downloads", exist_ok=True)
-            path = os.path.abspath(os.path.join("downloads", f"repojam_{clip_id}.mp3"))
-            with open(path, "wb") as f:
-                f.write(mp3.content)
-            out["saved_path"] = path
+            out["saved_path"] = download_mp3(out["audio_url"], f"repojam_{clip_id}.mp3")
 
     return out
 
@@ -908,4 +2286,8 @@ def repojam_once(body: RepoJamOnceBody):
 # --- local run entrypoint ---
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("app:app", host="0.0.0.0", port=PORT, reload=True)
+    if JAM_ENV == "production" or WORKERS > 1:
+        # no reloader; workers coordinate through STATE_DB, and /metrics series are labelled per worker
+        uvicorn.run("app:app", host="0.0.0.0", port=PORT, workers=WORKERS)
+    else:
+        uvicorn.run("app:app", host="0.0.0.0", port=PORT, reload=True)
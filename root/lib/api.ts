@@ -83,6 +83,14 @@ export class JamAPI {
     return this.request<GenerationResponse>(`/api/clip/${clipId}`)
   }
 
+  static async getClips(clipIds: string[]): Promise<GenerationResponse[]> {
+    return this.request<GenerationResponse[]>(`/api/clips?ids=${clipIds.map(encodeURIComponent).join(",")}`)
+  }
+
+  static getMixtapeUrl(sessionId: string): string {
+    return `${API_BASE}/api/mixtape/${encodeURIComponent(sessionId)}`
+  }
+
   static async waitForClip(clipId: string, timeoutSec = 180): Promise<GenerationResponse> {
     return this.request<GenerationResponse>(`/api/clip/${clipId}/wait?timeoutSec=${timeoutSec}`)
   }